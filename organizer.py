@@ -1,12 +1,26 @@
 import os
+import errno
 import shutil
+import sys
 import argparse
 import csv
 import hashlib
 import time
+import sqlite3
 from pathlib import Path
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# BLAKE3 is much faster than the stdlib hashes but is an optional dependency
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# Name of the hash behind file fingerprints; cached digests from a different
+# algorithm are never compared against fresh ones
+HASH_ALGORITHM = "blake3" if blake3 is not None else "blake2b-128"
 
 # Define file categories and their extensions
 CATEGORIES = {
@@ -22,6 +36,36 @@ CATEGORIES = {
     "Others": []  # Default category for unrecognized types
 }
 
+# Flat extension -> category lookup built from CATEGORIES
+EXT_TO_CATEGORY = {ext: category for category, extensions in CATEGORIES.items() for ext in extensions}
+
+# Read size used when hashing files (1 MiB, well above the 8 KiB BLAKE3 needs
+# to use its SIMD code paths)
+HASH_CHUNK_SIZE = 1 << 20
+
+# Bytes read for the quick fingerprint that screens same-sized files (4 KiB)
+QUICK_HASH_SIZE = 4096
+
+# posix_fadvise page cache hints are only available on some platforms (not
+# macOS or Windows)
+HAS_FADVISE = hasattr(os, "posix_fadvise")
+
+# Number of threads used to fingerprint files in parallel
+HASH_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+# Write buffer for the organization log
+LOG_BUFFER_SIZE = 64 * 1024
+
+# Characters that force csv.writer to quote a field in the log
+CSV_SPECIAL_CHARS = frozenset(',"\r\n')
+
+# Show a progress update every this many moved files (unless --verbose)
+PROGRESS_INTERVAL = 100
+
+# Fingerprints from earlier runs, keyed by path and checked against
+# size/mtime and the hash algorithm
+HASH_DB_PATH = Path.home() / ".cache" / "fileorganizer" / "hashdb.sqlite"
+
 # ASCII art for visual appeal
 BANNER = r"""
   ___ _ _        __          _                         
@@ -31,33 +75,117 @@ BANNER = r"""
                        |_|               |_|           
 """
 
-def create_category_folders(target_path):
-    """Create category folders in the target directory"""
-    for category in CATEGORIES:
-        folder_path = target_path / category
-        folder_path.mkdir(exist_ok=True)
+def new_hasher():
+    """Create the hash object used for file fingerprints (BLAKE3 or BLAKE2b)"""
+    if blake3 is not None:
+        return blake3.blake3()
+    return hashlib.blake2b(digest_size=16)
+
+def get_file_fingerprint(file_path):
+    """Generate a content fingerprint for a file, used to spot duplicates"""
+    hasher = new_hasher()
+    with open(file_path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        if HAS_FADVISE:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        
+        # Read straight into one reusable buffer; we do our own block reads so
+        # there's no point going through a BufferedReader as well. Files aren't
+        # memory-mapped: one truncated mid-hash (say, a download still being
+        # written) would kill the process with SIGBUS instead of a short read
+        buf = bytearray(HASH_CHUNK_SIZE)
+        view = memoryview(buf)
+        for n in iter(lambda: f.readinto(buf), 0):
+            hasher.update(view[:n])
+        
+        # The file is only renamed after this, so let the kernel drop its
+        # pages instead of evicting cached data that's still useful
+        if HAS_FADVISE:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return hasher.hexdigest()
+
+def get_quick_fingerprint(file_path):
+    """Fingerprint only the first QUICK_HASH_SIZE bytes of a file"""
+    hasher = new_hasher()
+    with open(file_path, "rb", buffering=0) as f:
+        hasher.update(f.read(QUICK_HASH_SIZE))
+    return hasher.hexdigest()
 
-def get_file_hash(file_path):
-    """Generate MD5 hash for a file"""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+def open_hash_db(db_path):
+    """Open the fingerprint cache database, or return None if it's unavailable"""
+    try:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Paths are stored as raw OS bytes (os.fsencode) so filenames that
+        # aren't valid UTF-8 can be cached too
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints "
+            "(path BLOB PRIMARY KEY, size INTEGER, mtime REAL, algorithm TEXT, hash TEXT)"
+        )
+        return conn
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ Fingerprint cache unavailable, hashing everything: {str(e)}")
+        return None
+
+def load_cached_fingerprints(hash_db, entries):
+    """Return {path: fingerprint} for entries unchanged since they were cached"""
+    cached = {}
+    if hash_db is None:
+        return cached
+    for entry in entries:
+        row = hash_db.execute(
+            "SELECT size, mtime, algorithm, hash FROM fingerprints WHERE path = ?",
+            (os.fsencode(entry.path),)
+        ).fetchone()
+        st = entry.stat()
+        if row and row[:3] == (st.st_size, st.st_mtime, HASH_ALGORITHM):
+            cached[entry.path] = row[3]
+    return cached
+
+def save_fingerprints(hash_db, rows, stale_paths):
+    """
+    Store (path, size, mtime, fingerprint) rows and drop the rows for
+    stale_paths in one transaction, then close the cache
+    """
+    if hash_db is None:
+        return
+    try:
+        with hash_db:
+            hash_db.executemany(
+                "DELETE FROM fingerprints WHERE path = ?",
+                [(os.fsencode(path),) for path in stale_paths]
+            )
+            hash_db.executemany(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                [
+                    (os.fsencode(path), size, mtime, HASH_ALGORITHM, file_hash)
+                    for path, size, mtime, file_hash in rows
+                ]
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not update fingerprint cache: {str(e)}")
+    finally:
+        hash_db.close()
 
-def organize_files(target_path, log_file):
+def organize_files(target_path, log_file, hash_db_path=HASH_DB_PATH, verbose=False):
     """
     Organize files in the target directory into categorized folders
+    With verbose=True every move is reported, otherwise just periodic progress
     Returns: Tuple of (total files moved, files moved per category, space saved)
     """
-    create_category_folders(target_path)
+    # Every move in this run shares one timestamp, which identifies the
+    # session when undoing
+    session_ts = datetime.now().isoformat()
     
     # Track statistics
     file_count = 0
     category_counts = defaultdict(int)
     original_size = 0
+    unique_size = 0
     duplicate_count = 0
-    seen_hashes = {}
+    seen_hashes = {}  # file hash -> name of first file seen with it
     
     # Create a log file if it doesn't exist
     if not log_file.exists():
@@ -65,83 +193,194 @@ def organize_files(target_path, log_file):
             writer = csv.writer(f)
             writer.writerow(["timestamp", "original_path", "destination", "file_hash", "file_size"])
     
-    # Process all items in the target directory
-    for item in target_path.iterdir():
-        # Skip directories, hidden files, and the log file itself
-        if (item.is_dir() or 
-            item.name.startswith('.') or 
-            item.name == "organization_log.csv" or
-            item.name == log_file.name):
-            continue
-            
-        file_size = item.stat().st_size
-        original_size += file_size
-        file_hash = get_file_hash(item)
-        moved = False
+    # Phase 1: collect the files to organize. Keep each DirEntry around so the
+    # type and size checks reuse the stat info cached from the directory scan.
+    # Scanning an absolute path gives absolute entry paths for the log and
+    # the fingerprint cache, whatever the current directory is
+    target_dir = os.path.abspath(target_path)
+    files = []
+    with os.scandir(target_dir) as entries:
+        for entry in entries:
+            # Skip directories, hidden files, and the log file itself
+            if (entry.is_dir() or 
+                entry.name.startswith('.') or 
+                entry.name == "organization_log.csv" or
+                entry.name == log_file.name):
+                continue
+            files.append((entry, entry.stat().st_size))
+    
+    # Files can only be duplicates if their size matches another file's, so
+    # only those need to be hashed at all
+    size_counts = Counter(file_size for _, file_size in files)
+    candidates = [(entry, file_size) for entry, file_size in files if size_counts[file_size] > 1]
+    
+    # Reuse fingerprints from earlier runs for files that haven't changed. With
+    # no candidates there's nothing to look up, so leave the cache untouched
+    hash_db = open_hash_db(hash_db_path) if candidates else None
+    cached_hashes = load_cached_fingerprints(hash_db, [entry for entry, _ in candidates])
+    cached_sizes = {file_size for entry, file_size in candidates if entry.path in cached_hashes}
+    uncached = [(entry, file_size) for entry, file_size in candidates if entry.path not in cached_hashes]
+    hash_rows = {}  # path -> (size, mtime, fingerprint) for every fingerprinted file
+    
+    # Destination folder for each category as a plain string ending in a path
+    # separator, so a file's destination is a single string concatenation
+    category_dirs = {category: os.path.join(target_dir, category, "") for category in CATEGORIES}
+    
+    # Bind the per-file helpers to locals to skip repeated global/attribute
+    # lookups in the classify and move loops
+    splitext = os.path.splitext
+    basename = os.path.basename
+    rename = os.rename
+    get_category = EXT_TO_CATEGORY.get
+    
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        # Fingerprint files concurrently - file reads and hash updates release
+        # the GIL, so threads overlap I/O waits and use several cores.
+        # Start with just the first few KiB of each file: same-sized files
+        # that already differ there can't be duplicates
+        quick_hashes = dict(zip(
+            (entry.path for entry, _ in uncached),
+            executor.map(get_quick_fingerprint, [entry for entry, _ in uncached])
+        ))
+        quick_counts = Counter(
+            (file_size, quick_hashes[entry.path]) for entry, file_size in uncached
+        )
         
-        # Check for duplicates
-        if file_hash in seen_hashes:
-            duplicate_count += 1
-            print(f"⚠️ Duplicate found: {item.name} (same as {seen_hashes[file_hash]})")
-            # We'll still process duplicates but note them in log
-        else:
-            seen_hashes[file_hash] = item.name
+        # Only files whose quick fingerprint collides get a full hash. Cached
+        # digests can't be compared with quick ones, so sizes that have a
+        # cached file are escalated too. Small files were read whole already.
+        to_hash = [
+            entry for entry, file_size in uncached
+            if file_size > QUICK_HASH_SIZE and (
+                quick_counts[(file_size, quick_hashes[entry.path])] > 1
+                or file_size in cached_sizes
+            )
+        ]
+        full_hash_paths = {entry.path for entry in to_hash}
+        fingerprints = executor.map(get_file_fingerprint, to_hash)
         
-        # Find matching category
-        file_extension = item.suffix.lower()
-        for category, extensions in CATEGORIES.items():
-            if file_extension in extensions:
-                destination = target_path / category / item.name
-                
+        # Phase 2: check for duplicates and plan moves in scan order
+        moves = []  # (source, destination, category, file hash, file size)
+        for entry, file_size in files:
+            original_size += file_size
+            if entry.path in cached_hashes:
+                file_hash = cached_hashes[entry.path]
+            elif entry.path in full_hash_paths:
+                file_hash = next(fingerprints)
+            elif entry.path in quick_hashes and file_size <= QUICK_HASH_SIZE:
+                # The quick fingerprint covered the whole file
+                file_hash = quick_hashes[entry.path]
+            else:
+                file_hash = ""
+            if file_hash:
+                hash_rows[entry.path] = (file_size, entry.stat().st_mtime, file_hash)
+            
+            # Check for duplicates
+            if file_hash and file_hash in seen_hashes:
+                duplicate_count += 1
+                print(f"⚠️ Duplicate found: {entry.name} (same as {seen_hashes[file_hash]})")
+                # We'll still process duplicates but note them in log
+            else:
+                if file_hash:
+                    seen_hashes[file_hash] = entry.name
+                unique_size += file_size
+            
+            # Find matching category (unrecognized types go to Others)
+            file_extension = splitext(entry.name)[1].lower()
+            category = get_category(file_extension, "Others")
+            destination = category_dirs[category] + entry.name
+            moves.append((entry.path, destination, category, file_hash, file_size))
+    
+    # Phase 3: move files sorted by destination, so all renames into the same
+    # folder happen back to back
+    moves.sort(key=lambda move: move[1])
+    log_rows = []
+    moved_paths = []  # (source, destination) of every completed move
+    moved_lines = []  # per-file report, written in one go when verbose
+    created_dirs = set()  # categories whose folder is known to exist
+    progress_shown = False  # a "\r" progress line is waiting to be overwritten
+    with open(log_file, "a", newline="", buffering=LOG_BUFFER_SIZE) as log:
+        try:
+            for source, destination, category, file_hash, file_size in moves:
+                name = basename(source)
                 try:
-                    shutil.move(str(item), str(destination))
-                    print(f"✓ Moved {item.name} to {category}/")
-                    file_count += 1
-                    category_counts[category] += 1
+                    # Make sure the log can record this move before making it:
+                    # rows are written in one batch at the end, so a path the
+                    # log's encoding can't hold would otherwise fail that write
+                    # and leave the whole session unlogged
+                    (source + destination).encode(log.encoding)
                     
-                    # Log the move
-                    with open(log_file, "a", newline="") as f:
-                        writer = csv.writer(f)
-                        writer.writerow([
-                            datetime.now().isoformat(),
-                            str(item),
-                            str(destination),
-                            file_hash,
-                            file_size
-                        ])
+                    # Only create the category folders that are actually used
+                    if category not in created_dirs:
+                        os.makedirs(category_dirs[category], exist_ok=True)
+                        created_dirs.add(category)
                     
-                    moved = True
-                    break
-                except Exception as e:
-                    print(f"⚠️ Error moving {item.name}: {str(e)}")
-                    moved = True  # Mark as moved to avoid duplicate handling
-                    break
-        
-        # Handle unrecognized file types
-        if not moved:
-            destination = target_path / "Others" / item.name
-            try:
-                shutil.move(str(item), str(destination))
-                print(f"✓ Moved {item.name} to Others/")
-                file_count += 1
-                category_counts["Others"] += 1
-                
-                # Log the move
-                with open(log_file, "a", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([
-                        datetime.now().isoformat(),
-                        str(item),
-                        str(destination),
+                    # Category folders normally share the target's filesystem,
+                    # so a plain rename does the job without shutil.move's
+                    # checks. os.rename rather than os.replace, so Windows still
+                    # refuses to overwrite a file already in the category
+                    # folder. A folder the user pointed at another drive needs
+                    # the copy fallback, though
+                    try:
+                        rename(source, destination)
+                    except OSError as e:
+                        if e.errno != errno.EXDEV:
+                            raise
+                        shutil.move(source, destination)
+                    moved_paths.append((source, destination))
+                    file_count += 1
+                    category_counts[category] += 1
+                    if verbose:
+                        moved_lines.append(f"✓ Moved {name} to {category}/\n")
+                    elif file_count % PROGRESS_INTERVAL == 0:
+                        print(f"📦 {file_count} files moved...", end="\r", flush=True)
+                        progress_shown = True
+                    log_rows.append([
+                        session_ts,
+                        source,
+                        destination,
                         file_hash,
                         file_size
                     ])
-            except Exception as e:
-                print(f"⚠️ Error moving {item.name}: {str(e)}")
+                except Exception as e:
+                    # Start errors on a fresh line rather than over the progress
+                    if progress_shown:
+                        print()
+                        progress_shown = False
+                    print(f"⚠️ Error moving {name}: {str(e)}")
+        finally:
+            # Log every completed move in one write, even if we're interrupted.
+            # Every path was checked to be encodable before its move; unless a
+            # path needs quoting, format the rows directly rather than paying
+            # for csv.writer's per-field quoting checks
+            if any(CSV_SPECIAL_CHARS.intersection(row[1] + row[2]) for row in log_rows):
+                csv.writer(log).writerows(log_rows)
+            else:
+                log.write("".join(
+                    f"{timestamp},{source},{destination},{file_hash},{file_size}\r\n"
+                    for timestamp, source, destination, file_hash, file_size in log_rows
+                ))
+    
+    # Dump the per-file report, or end the progress line
+    if verbose:
+        sys.stdout.write("".join(moved_lines))
+    elif progress_shown:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
     
-    # Calculate space saved (only unique files)
-    unique_files_size = sum(size for hash, size in seen_hashes.values())
-    space_saved = original_size - unique_files_size
+    # Only files still in the target folder will be scanned again, so only
+    # they are cached. Rows for files that moved out are dropped, which keeps
+    # the cache from growing with every file ever organized
+    for source, _ in moved_paths:
+        hash_rows.pop(source, None)
+    save_fingerprints(
+        hash_db,
+        [(path, *row) for path, row in hash_rows.items()],
+        [source for source, _ in moved_paths]
+    )
+    
+    # Space saved is everything that isn't a unique file
+    space_saved = original_size - unique_size
     
     return file_count, dict(category_counts), duplicate_count, space_saved
 
@@ -151,29 +390,40 @@ def undo_organization(log_file):
         print("❌ No organization log found - nothing to undo!")
         return 0
     
-    # Read all log entries
+    # Only three columns are needed, so read rows as plain lists and look the
+    # columns up by position instead of building a dict per row
+    latest_timestamp = None
+    latest_moves = []  # (original, destination) pairs from the latest session
     with open(log_file, "r", newline="") as f:
-        reader = csv.DictReader(f)
-        moves = list(reader)
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header:
+            ts_idx = header.index("timestamp")
+            src_idx = header.index("original_path")
+            dst_idx = header.index("destination")
+            
+            # Each organization session has a unique timestamp, so keep only
+            # the moves of the newest one seen so far
+            for row in reader:
+                # csv.reader yields [] for blank lines, which DictReader skipped
+                if not row:
+                    continue
+                timestamp = row[ts_idx]
+                if latest_timestamp is None or timestamp > latest_timestamp:
+                    latest_timestamp = timestamp
+                    latest_moves = []
+                if timestamp == latest_timestamp:
+                    latest_moves.append((row[src_idx], row[dst_idx]))
     
-    if not moves:
+    if not latest_moves:
         print("ℹ️ Organization log is empty - nothing to undo!")
         return 0
     
-    # Group moves by timestamp (each organization session has a unique timestamp)
-    sessions = defaultdict(list)
-    for move in moves:
-        sessions[move['timestamp']].append(move)
-    
-    # Get the latest session
-    latest_timestamp = max(sessions.keys())
-    latest_moves = sessions[latest_timestamp]
-    
     # Undo each move in the latest session
     restored_count = 0
-    for move in latest_moves:
-        src = Path(move['destination'])
-        dest = Path(move['original_path'])
+    for original_path, destination in latest_moves:
+        src = Path(destination)
+        dest = Path(original_path)
         
         # Ensure parent directory exists
         dest.parent.mkdir(parents=True, exist_ok=True)
@@ -235,6 +485,11 @@ def main():
         default="organization_log.csv",
         help="Log file path (default: organization_log.csv)"
     )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="List every moved file"
+    )
     
     args = parser.parse_args()
     
@@ -269,7 +524,9 @@ def main():
     # Perform organization
     print(f"\n🚀 Starting organization of: {target_path}")
     start_time = time.time()
-    total_files, category_counts, duplicate_count, space_saved = organize_files(target_path, log_path)
+    total_files, category_counts, duplicate_count, space_saved = organize_files(
+        target_path, log_path, verbose=args.verbose
+    )
     duration = time.time() - start_time
     
     # Print summary